@@ -2,34 +2,29 @@ import importlib.metadata
 
 __version__ = importlib.metadata.version(__package__)
 
-dependencies = ['pandas', 'sattrack']
-missingDependencies = []
-
-for dep in dependencies:
-    try:
-        __import__(dep)
-    except ImportError as e:
-        missingDependencies.append(dep)
-
-if missingDependencies:
-    errorMessage = 'Unable to import dependencies:\n' + '\n'.join(missingDependencies)
-    raise ImportError(errorMessage)
-
-from .frames import (
-    getLaunchData
-)
+# The frames module imports numpy, pandas and sattrack, so a missing dependency surfaces here.
+try:
+    from .frames import (
+        getLaunchData
+    )
+except ModuleNotFoundError as e:
+    raise ImportError(f'Unable to import dependency: {e.name}') from e
 
 from .import_tle import (
     importConfig,
     validateBatchName,
     importStarlinkTLE,
+    loadTLEs,
     fetchTLEsFromGroup,
     fetchAllTLEs,
+    fetchTLEsByName,
+    clearTLECache,
 )
 
 from .passes import (
     getNthPasses,
     getBatchTimes,
+    shutdownPassPool,
 )
 
 from .update_starlink_tle import (
@@ -50,10 +45,14 @@ __all__ = (
     'importConfig',
     'validateBatchName',
     'importStarlinkTLE',
+    'loadTLEs',
     'fetchTLEsFromGroup',
     'fetchAllTLEs',
+    'fetchTLEsByName',
+    'clearTLECache',
     'getNthPasses',
     'getBatchTimes',
+    'shutdownPassPool',
     'getResponse',
     'exportBody',
     'updateStarlinkTLE',
@@ -7,7 +7,8 @@ if __name__ == '__main__':
     args = getArgs()
     if args['forceUpdate']:
         print('updating TLEs')
-        exitValue = update_starlink_tle.main()
+        # The user asked for an update, so download the TLEs even if the server reports them unchanged.
+        exitValue = update_starlink_tle.main(force=True)
         if exitValue != 0:
             exit(exitValue)
 
@@ -60,7 +60,7 @@ def createParser() -> argparse.ArgumentParser:
 
     passGroup.add_argument('-n', '--visible_number', metavar='COUNT', type=int, default=1, dest='visibleNumber',
                            help='find the nth visible pass from the time given, default is 1')
-    passGroup.add_argument('--time', type=dataTimeToJulianDate, default=now(),
+    passGroup.add_argument('--time', type=dataTimeToJulianDate, default=None,
                            help='time to begin looking for visible passes, default is current time')
 
     parser.add_argument('-f', '--force-update', action='store_true', default=False, dest='forceUpdate',
@@ -79,4 +79,8 @@ def createParser() -> argparse.ArgumentParser:
 def getArgs() -> dict:
     parser = createParser()
     namespace = parser.parse_args()
+    # The current time is only computed if a time wasn't given.
+    if namespace.time is None:
+        namespace.time = now()
+
     return namespace.__dict__
@@ -1,5 +1,6 @@
-from math import degrees
+from math import sqrt
 
+import numpy as np
 import pandas as pd
 from sattrack.orbit import Satellite
 from sattrack.util import EARTH_EQUITORIAL_RADIUS
@@ -16,14 +17,32 @@ def computeApsides(sma: float, ecc: float) -> (int, int):
 
 SCALE = 1.0
 
+ELEMENTS_DTYPE = np.dtype([
+    ('inc', np.float64),
+    ('raan', np.float64),
+    ('aop', np.float64),
+    ('trueAnomaly', np.float64),
+    ('sma', np.float64),
+    ('ecc', np.float64),
+])
 
-def findOutliersIQR(df: pd.Series) -> pd.Series:
-    q1 = df.quantile(0.25)
-    q3 = df.quantile(0.75)
+
+def _findOutlierMask(arr: np.ndarray) -> np.ndarray:
+    """Returns a boolean mask of the values of arr above the upper interquartile range fence."""
+
+    # Groups with one or two satellites may have no gaps left once the ignored rows are dropped.
+    if arr.size == 0:
+        return np.zeros(0, dtype=bool)
+
+    q1, q3 = np.quantile(arr, (0.25, 0.75))
     IQR = q3 - q1
 
     # We shouldn't worry about the lower outliers, as those satellites are in the same group.
-    return df[df > (q3 + SCALE * IQR)]
+    return arr > (q3 + SCALE * IQR)
+
+
+def findOutliersIQR(df: pd.Series) -> pd.Series:
+    return df.iloc[np.flatnonzero(_findOutlierMask(df.to_numpy()))]
 
 
 def adjustPhase(df: pd.DataFrame) -> pd.DataFrame:
@@ -31,136 +50,173 @@ def adjustPhase(df: pd.DataFrame) -> pd.DataFrame:
     maxIndex = df['gap'].idxmax()
     # If maxIndex is zero then the rows are already in order.
     if maxIndex != 0:
-        arr = df['phase'].tolist()
+        arr = df['phase'].to_numpy(copy=True)
         # All rows from maxIndex to the end should precede the first rows, adjust by subtracting 360.
-        for i in range(maxIndex, len(arr)):
-            arr[i] -= 360
+        arr[maxIndex:] -= 360
 
         df = df.assign(phase=arr)
 
-    maxValue = df['phase'].max()
-    df['phase'] = df['phase'].apply(lambda x: x - maxValue)
+    df['phase'] -= df['phase'].max()
     df.sort_values('phase', ascending=False, inplace=True)
 
     return df.reset_index(drop=True)
 
 
+def batchGetElements(tleList, jd) -> np.ndarray:
+    """Compute the orbital elements of each satellite in tleList at jd in a single pass. The result is a structured
+    numpy.ndarray with the fields of ELEMENTS_DTYPE, with angles in radians and the semi-major axis in kilometers."""
+
+    elements = (Satellite(tle).getElements(jd) for tle in tleList)
+    values = ((el.inc, el.raan, el.aop, el.trueAnomaly, el.sma, el.ecc) for el in elements)
+
+    return np.fromiter(values, dtype=ELEMENTS_DTYPE, count=len(tleList))
+
+
 def generateDataFrame(tleList, jd, adjust=True) -> pd.DataFrame:
     """Generate a pandas.DataFrame filled with satellite information derived from the tleList and jd parameters. If
     adjust is True, data is sorted by phase angle, the gap column is inserted and all phase angles are adjusted by
     the maximum value. The index is also reset when adjust is True."""
 
-    elements = [Satellite(tle).getElements(jd) for tle in tleList]
-    apsides = [computeApsides(el.sma, el.ecc) for el in elements]
-    phases = [degrees(el.aop + el.trueAnomaly) % 360.0 for el in elements]
+    elements = batchGetElements(tleList, jd)
+    # Each array below is a fresh float64 array, so the remaining steps are done in place to avoid temporaries.
+    phase = elements['aop'] + elements['trueAnomaly']
+    np.degrees(phase, out=phase)
+    np.mod(phase, 360.0, out=phase)
+    perigee, apogee = computeApsides(elements['sma'], elements['ecc'])
+    np.round(perigee, 1, out=perigee)
+    np.round(apogee, 1, out=apogee)
     data = {
-        'sat-id': (tle.name for tle in tleList),
-        'inc': (degrees(el.inc) for el in elements),
-        'raan': (degrees(el.raan) for el in elements),
-        'phase': phases,
-        'perigee': [round(rp, 1) for rp, _ in apsides],
-        'apogee': [round(ra, 1) for _, ra in apsides],
+        'sat-id': [tle.name for tle in tleList],
+        'inc': np.degrees(elements['inc']),
+        'raan': np.degrees(elements['raan']),
+        'phase': phase,
+        'perigee': perigee,
+        'apogee': apogee,
     }
 
-    df = pd.DataFrame(data)
+    # The column arrays were created above and aren't referenced elsewhere, so pandas doesn't need to copy them.
+    df = pd.DataFrame(data, copy=False)
 
     if adjust is True:
-        # Sort rows by latArg and update index to be in order.
-        df.sort_values('phase', inplace=True)
-        df.reset_index(drop=True, inplace=True)
-
-        # Generate gap column in DataFrame.
-        phases = df['phase'].tolist()
-        gaps = [phases[i] - phases[i - 1] for i in range(len(phases))]
-        gaps[0] += 360
-        df['gap'] = gaps
-        df = adjustPhase(df)
+        df = applyGaps(df)
 
     return df
 
 
 def applyGaps(df: pd.DataFrame) -> pd.DataFrame:
-    """The df argument is sorted, its index reset, the gap column inserted, and the phase angles adjusted. This is
-    similar to setting the adjust parameter to True in the generateDataFrame method.
+    """The df argument is sorted (unless it already is), its index reset, the gap column inserted, and the phase angles
+    adjusted. This is similar to setting the adjust parameter to True in the generateDataFrame method.
 
     The following are equivalent:
         applyGaps(generateDataFrame(tleList, jd, False)
         generateDataFrame(tleList, jd, True)"""
 
-    df2 = df.sort_values('phase').reset_index(drop=True)
+    # Checking the order is a single pass, which is cheaper than sorting rows that are already in order.
+    if df['phase'].is_monotonic_increasing:
+        df2 = df.reset_index(drop=True)
+    else:
+        df2 = df.sort_values('phase').reset_index(drop=True)
 
-    phases = df2['phase'].tolist()
-    gaps = [phases[i] - phases[i - 1] for i in range(len(phases))]
-    gaps[0] += 360
+    phases = df2['phase'].to_numpy()
+    gaps = np.empty_like(phases)
+    gaps[1:] = np.diff(phases)
+    gaps[0] = phases[0] - phases[-1] + 360
     df2['gap'] = gaps
 
     return adjustPhase(df2)
 
 
 def findSameRaan(df: pd.Series, limit: float) -> pd.Series:
-    """Finds all entries of a DataFrame with similar raan values. This is determined using the DataFrame.std() method.
+    """Finds all entries of a DataFrame with similar raan values. This is determined using the sample standard deviation
+    of the leading raan values.
 
     The df argument must be sorted by raan column, and limit is the value which the standard deviation is compared."""
 
-    i = 1
-    while (pd.isna(df.head(i)['raan'].std()) or df.head(i)['raan'].std() < limit) and i <= len(df):
-        i += 1
+    # Share the cut rule with splitByRaan, so the two can't disagree about a raan right at the limit.
+    raans = df['raan'].to_numpy()
+    return df.iloc[_splitByRaanIndices(raans, limit)[0]] if raans.size else df.iloc[:0]
+
+
+def _splitByRaanIndices(raans: np.ndarray, limit: float) -> list[slice]:
+    """Walks the sorted raans array once and returns the slices of consecutive values whose sample standard deviation
+    stays below limit. This is the single pass equivalent of repeatedly calling findSameRaan, where the running
+    variance is updated with Welford's algorithm instead of being recomputed for every prefix."""
+
+    slices = []
+    start = 0
+    n, mean, m2 = 0, 0.0, 0.0
+    for i, value in enumerate(raans.tolist()):
+        n += 1
+        delta = value - mean
+        mean += delta / n
+        m2 += delta * (value - mean)
 
-    return df.iloc[:i - 1]
+        # The first value of a plane has no deviation, so it always belongs to the plane.
+        if n > 1 and sqrt(m2 / (n - 1)) >= limit:
+            slices.append(slice(start, i))
+            start = i
+            n, mean, m2 = 1, value, 0.0
+
+    if start < len(raans):
+        slices.append(slice(start, len(raans)))
+
+    return slices
 
 
 def splitByRaan(df: pd.DataFrame) -> list[pd.DataFrame]:
     """Splits a DataFrame into a list of DataFrames that have similar raan values."""
 
     frame = df.sort_values('raan')
-    planes = []
-    while frame.empty is False:
-        bunch = findSameRaan(frame, 1.25)
-        planes.append(bunch)
-        frame.drop(bunch.index, inplace=True)
+    slices = _splitByRaanIndices(frame['raan'].to_numpy(), 1.25)
 
-    return planes
+    return [frame.iloc[s] for s in slices]
 
 
-def splitByPhase(df: pd.DataFrame, ignore=None) -> list[pd.DataFrame]:
-    """Splits a DataFrame of satellites in the same plane into batches based on their phase angles. The ignore argument
-    should be an array of indices to ignore while computing interquartile ranges."""
+def _splitSpan(gaps: np.ndarray, start: int, end: int, ignore: list[int]) -> list[tuple[int, int]]:
+    """Positional form of splitByPhase, splitting the rows start to end of a plane sorted by descending phase using
+    the plane's gap array. The ignore argument is a list of indices relative to start, which may be negative. Returns
+    the (start, end) bounds of each batch."""
 
+    count = end - start
     # As an implementation detail, the last row is always the largest gap, so we don't need to compute max.
-    if ignore is None:
-        ignore = []
-    if -1 in ignore:
-        ignore[ignore.index(-1)] = len(df) - 1
-    outliers = findOutliersIQR(df.drop(ignore)['gap'])
+    keep = np.ones(count, dtype=bool)
+    keep[ignore] = False
+    positions = np.flatnonzero(keep)
+    outliers = positions[_findOutlierMask(gaps[start:end][positions])]
 
     # If there are no outliers besides the first gap, there is only one group.
-    if len(outliers) == 0:
-        return [df.copy()]
+    if outliers.size == 0:
+        return [(start, end)]
 
-    indices = list(outliers.index)
-    if len(df) - 1 not in indices:
-        indices.append(len(df))
-    groups = []
+    indices = outliers.tolist()
+    if count - 1 not in indices:
+        indices.append(count)
+    spans = []
     idx = 0
     for i in indices:
-        group = df.iloc[idx:i + 1].sort_values('phase', ascending=False)
-        groups.append(group.reset_index(drop=True))
+        spans.append((start + idx, start + min(i + 1, count)))
         idx = i + 1
 
-    return groups
+    return spans
 
 
-def refineBatch(groups: list[pd.DataFrame]) -> list[pd.DataFrame]:
-    """Recursively refines a batch into further batches if there exists new outliers after the data is split."""
+def _refineSpans(gaps: np.ndarray, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Positional form of refineBatch, operating on the (start, end) bounds of batches within a plane's gap array."""
 
-    rtn = [g for g in groups]
-    count = -1
-    while len(rtn) != count:
-        # Set the number of batches before computing the next. When they no longer change after an iteration, stop
-        # iterating.
+    rtn = list(spans)
+    # Indices of the spans that still need checking. A span that didn't split would give the same result if it was
+    # checked again, so only spans created by a split are checked on the next iteration. When no span splits, stop
+    # iterating.
+    dirty = set(range(len(rtn)))
+    while dirty:
         count = len(rtn)
         tmp = []
-        for i, group in enumerate(rtn):
+        nextDirty = set()
+        for i, (start, end) in enumerate(rtn):
+            if i not in dirty:
+                tmp.append((start, end))
+                continue
+
             if i == count - 1:
                 if i == 0:
                     ignore = [-1]
@@ -169,15 +225,49 @@ def refineBatch(groups: list[pd.DataFrame]) -> list[pd.DataFrame]:
             else:
                 ignore = []
 
-            # Check if a batch is split again, creating a folded array in the process.
-            tmp.append(splitByPhase(group, ignore=ignore))
+            # Check if a batch is split again, marking the new batches to be checked on the next iteration.
+            split = _splitSpan(gaps, start, end, ignore)
+            if len(split) > 1:
+                nextDirty.update(range(len(tmp), len(tmp) + len(split)))
+            tmp.extend(split)
 
-        # Unfold the array into a single dimensional array of the groups, then repeat until finished.
-        rtn = [element for subArr in tmp for element in subArr]
+        rtn = tmp
+        dirty = nextDirty
 
     return rtn
 
 
+def splitByPhase(df: pd.DataFrame, ignore=None) -> list[pd.DataFrame]:
+    """Splits a DataFrame of satellites in the same plane into batches based on their phase angles. The df argument
+    must be sorted by descending phase, as returned by applyGaps. The ignore argument should be an array of indices to
+    ignore while computing interquartile ranges."""
+
+    if ignore is None:
+        ignore = []
+    spans = _splitSpan(df['gap'].to_numpy(), 0, len(df), ignore)
+
+    if len(spans) == 1:
+        return [df.copy()]
+
+    # Slices of df are already in descending phase order, so they don't need sorting again.
+    return [df.iloc[start:end].reset_index(drop=True) for start, end in spans]
+
+
+def refineBatch(groups: list[pd.DataFrame]) -> list[pd.DataFrame]:
+    """Recursively refines a batch into further batches if there exists new outliers after the data is split. The
+    groups should be consecutive batches of a single plane, as returned by splitByPhase."""
+
+    # pd.concat raises on an empty list.
+    if not groups:
+        return []
+
+    frame = pd.concat(groups, ignore_index=True)
+    bounds = np.cumsum([0] + [len(group) for group in groups]).tolist()
+    spans = _refineSpans(frame['gap'].to_numpy(), list(zip(bounds[:-1], bounds[1:])))
+
+    return [frame.iloc[start:end].reset_index(drop=True) for start, end in spans]
+
+
 def splitIntoPlanes(df: pd.DataFrame) -> list[pd.DataFrame]:
     """Return a list of DataFrames where each DataFrame pertains to a specific orbital plane."""
 
@@ -190,10 +280,12 @@ def splitIntoBatches(df: pd.DataFrame) -> list[pd.DataFrame]:
     """Return a list of DataFrames where each DataFrame pertains to a batch of satellites dependent on phase angle. All
     satellites of df should be in a single orbital plane."""
 
-    groups = splitByPhase(df, [-1])
-    refinedGroups = refineBatch(groups)
+    # The batches are always consecutive rows of df, so they're refined as positional spans and only turned into
+    # DataFrames at the end. The rows of df are already sorted by descending phase.
+    gaps = df['gap'].to_numpy()
+    spans = _refineSpans(gaps, _splitSpan(gaps, 0, len(df), [-1]))
 
-    return refinedGroups
+    return [df.iloc[start:end].reset_index(drop=True) for start, end in spans]
 
 
 def getLaunchData(group: str, launch: str, jd) -> list[list[pd.DataFrame]]:
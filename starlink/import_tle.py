@@ -1,5 +1,6 @@
+import os
 import tomllib
-from itertools import islice
+from functools import lru_cache
 
 from sattrack.exceptions import TLEException
 from sattrack.sgp4 import TwoLineElement
@@ -10,9 +11,21 @@ def importConfig(filename):
         return tomllib.load(f)
 
 
+@lru_cache(maxsize=4)
+def _importConfig(filename: str, mtime: int) -> dict:
+    # The mtime argument is only part of the cache key, so the file is re-parsed after it's modified.
+    return importConfig(filename)
+
+
+def _defaultConfig() -> dict:
+    # This is deferred until first use rather than done at import, as starlink.toml is relative to the working
+    # directory.
+    return _importConfig('starlink.toml', os.stat('starlink.toml').st_mtime_ns)
+
+
 def validateBatchName(group: str, launch: str, toml=None) -> bool:
     if toml is None:
-        toml = importConfig('starlink.toml')
+        toml = _defaultConfig()
 
     token = f'{group}-{launch}'
     return token in toml['launches']
@@ -20,22 +33,64 @@ def validateBatchName(group: str, launch: str, toml=None) -> bool:
 
 def importStarlinkTLE(filename):
     with open(filename, 'r') as f:
+        # readlines() rather than str.splitlines(), which would also split on form feeds and unicode line separators.
         rawTLEs = f.readlines()
 
-    tleIterator = iter(rawTLEs)
-    condensedTLEs = []
-    while True:
-        tleString = ''.join(islice(tleIterator, 3))
-        if not tleString:
-            break
-        condensedTLEs.append(tleString)
+    # Each TLE is a name line followed by the two element lines.
+    return [''.join(rawTLEs[i:i + 3]) for i in range(0, len(rawTLEs), 3)]
+
+
+@lru_cache(maxsize=None)
+def _parseTLE(tleString: str) -> TwoLineElement:
+    # Keyed on the TLE text itself, so a satellite whose TLE is unchanged between file updates is only parsed once.
+    # Unbounded so fetchAllTLEs can't evict the TLEs of a batch, clearTLECache releases them after an update.
+    return TwoLineElement(tleString)
+
+
+@lru_cache(maxsize=4)
+def _loadTLEs(filename: str, mtime: int) -> (list[str], dict[str, str], dict[str, list[str]]):
+    """Split a TLE file into its raw TLE strings, an index of the raw TLE strings by satellite name and an index of the
+    raw TLE strings by their international designator (launch year and number, e.g. '23026'). No TwoLineElement
+    objects are created here, so callers only pay for parsing the TLEs they use. The mtime argument is only used as
+    part of the cache key, so the file is re-read after it is modified."""
+
+    tleStringList = importStarlinkTLE(filename)
+    nameIndex = {}
+    designatorIndex = {}
+    for tle in tleStringList:
+        lines = tle.split('\n', 2)
+        nameIndex[lines[0].rstrip()] = tle
+        designatorIndex.setdefault(lines[1][9:14], []).append(tle)
+
+    return tleStringList, nameIndex, designatorIndex
+
 
-    return condensedTLEs
+def loadTLEs(filename: str) -> (list[str], dict[str, str], dict[str, list[str]]):
+    """Return the split contents of a TLE file, reusing the previous result if the file hasn't changed since it was
+    last read. The returned objects are shared between calls and shouldn't be modified."""
+
+    return _loadTLEs(filename, os.stat(filename).st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _loadTLEMap(filename: str, mtime: int) -> dict[str, TwoLineElement]:
+    _, nameIndex, _ = _loadTLEs(filename, mtime)
+
+    return {name: _parseTLE(tle) for name, tle in nameIndex.items()}
+
+
+def clearTLECache():
+    """Discard all cached TLE data. Caches are keyed on file modification times so this isn't needed for correctness
+    after a file changes, but it releases the TLEs parsed from previous versions of the file."""
+
+    _parseTLE.cache_clear()
+    _loadTLEs.cache_clear()
+    _loadTLEMap.cache_clear()
 
 
 def fetchTLEsFromGroup(group: str, launch: str, toml=None):
     if toml is None:
-        toml = importConfig('starlink.toml')
+        toml = _defaultConfig()
 
     if not validateBatchName(group, launch, toml):
         raise ValueError(f'batch name ({group}-{launch}) not found in launch list')
@@ -44,10 +99,10 @@ def fetchTLEsFromGroup(group: str, launch: str, toml=None):
     launchToken = f'L{launch}'
     intDes = toml[groupToken][launchToken]
 
-    tleStringList = importStarlinkTLE('starlink.tle')
-    tleMasterList = list((TwoLineElement(tle) for tle in tleStringList))
+    # Only the TLEs of the batch are parsed, after looking them up by their designator.
+    _, _, designatorIndex = loadTLEs('starlink.tle')
 
-    rtn = list((tle for tle in tleMasterList if int(tle.line1[9:14]) == intDes))
+    rtn = [_parseTLE(tle) for tle in designatorIndex.get(f'{intDes:05d}', [])]
 
     if not rtn:
         raise TLEException(f'no TLE data for batch {group}-{launch}')
@@ -56,6 +111,16 @@ def fetchTLEsFromGroup(group: str, launch: str, toml=None):
 
 
 def fetchAllTLEs() -> dict[str, TwoLineElement]:
-    tleStringList = importStarlinkTLE('starlink.tle')
+    filename = 'starlink.tle'
+
+    # Copy the cached map so callers can modify what they get back without changing it for every later caller.
+    return dict(_loadTLEMap(filename, os.stat(filename).st_mtime_ns))
+
+
+def fetchTLEsByName(names) -> list[TwoLineElement]:
+    """Return the TLEs for each satellite name in names, in the same order. Unlike fetchAllTLEs only the requested
+    TLEs are parsed."""
+
+    _, nameIndex, _ = loadTLEs('starlink.tle')
 
-    return {tle.split('\n', 1)[0].rstrip(): TwoLineElement(tle) for tle in tleStringList}
+    return [_parseTLE(nameIndex[name]) for name in names]
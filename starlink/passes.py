@@ -1,39 +1,154 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
 import pandas as pd
 from sattrack.coordinates import GeoPosition
 from sattrack.orbit import Satellite
+from sattrack.sgp4 import TwoLineElement
 from sattrack.spacetime import JulianDate
 from sattrack.topocentric import getNextPass
 
-from starlink.import_tle import fetchAllTLEs
+from starlink.import_tle import fetchTLEsByName
+
+
+# Number of days after the search time to look for visible passes before giving up on a satellite.
+MAX_SEARCH_DAYS = 7
+
+# Satellites by name, along with the TLE lines they were built from. An entry is replaced when the satellite's TLE
+# changes, so only one Satellite is kept per satellite regardless of how often the TLE file is updated. Each process has
+# its own cache, which lasts between batches because the worker pool below is reused.
+_satelliteCache: dict[str, tuple[str, str, Satellite]] = {}
+
+# Pool of worker processes for the pass searches. It's created on first use and reused for every batch afterwards, so
+# worker start up (and with spawn or forkserver, re-importing pandas and sattrack) is only paid once per process.
+_executor: ProcessPoolExecutor | None = None
+
+
+def _getExecutor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+
+    return _executor
+
+
+def shutdownPassPool(wait=True):
+    """Shut down the worker processes used by getNthPasses, which otherwise stay idle until the process exits. A new
+    pool is started the next time one is needed."""
+
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def _getSatellite(name: str, line1: str, line2: str) -> Satellite:
+    cached = _satelliteCache.get(name)
+    if cached is None or cached[0] != line1 or cached[1] != line2:
+        tle = TwoLineElement(f'{name}\n{line1}\n{line2}')
+        cached = _satelliteCache[name] = (line1, line2, Satellite(tle))
+
+    return cached[2]
+
+
+def _findNthPass(name: str, line1: str, line2: str, geo: GeoPosition, jd: JulianDate, visibleNumber: int):
+    """Find the nth visible pass of a single satellite after jd, or None if there isn't one within MAX_SEARCH_DAYS
+    days. The satellite is given by its TLE lines, so the same Satellite is reused for every search of it."""
+
+    sat = _getSatellite(name, line1, line2)
+
+    # When looking for the first visible pass and the next pass is visible, the loop is skipped entirely.
+    nextPass = getNextPass(sat, geo, jd)
+    currentNumber = 1 if nextPass.visible else 0
+
+    while currentNumber < visibleNumber:
+        # Some satellites wont produce visible passes, so stop searching after a while.
+        if nextPass.riseInfo.time - jd > MAX_SEARCH_DAYS:
+            return None
+
+        nextPass = getNextPass(sat, geo, nextPass)
+        if nextPass.visible:
+            currentNumber += 1
+
+    return nextPass
+
+
+def _findNthPassWorker(name: str, line1: str, line2: str, latitude: float, longitude: float, elevation: float,
+                       jdValue: float, timezone: float, visibleNumber: int):
+    """Entry point of the worker processes. Only strings and floats are sent to the workers, the GeoPosition and
+    JulianDate are rebuilt here."""
+
+    geo = GeoPosition(latitude, longitude, elevation)
+    jd = JulianDate.fromNumber(jdValue, timezone)
+
+    return _findNthPass(name, line1, line2, geo, jd, visibleNumber)
 
 
 def getNthPasses(df: pd.DataFrame, geo: GeoPosition, jd: JulianDate, visibleNumber=1) -> list:
-    tleMap = fetchAllTLEs()
-    tleList = [tleMap[satId] for satId in df['sat-id']]
+    """Find the nth visible pass of each satellite in df, or None for a satellite without one. With more than one
+    satellite the searches run in a pool of worker processes, so scripts calling this need the usual
+    if __name__ == '__main__' guard on platforms that spawn workers."""
+
+    tleList = fetchTLEsByName(df['sat-id'])
+
+    # It's not worth sending a single satellite to the pool.
+    count = len(tleList)
+    if count <= 1:
+        return [_findNthPass(tle.name, tle.line1, tle.line2, geo, jd, visibleNumber) for tle in tleList]
+
+    # Hand each worker a few chunks at a time to cut down on the per-task overhead while still balancing the load.
+    executor = _getExecutor()
+    workers = min(count, os.cpu_count() or 1)
+    chunksize = max(1, count // (4 * workers))
+    args = zip(*[(tle.name, tle.line1, tle.line2) for tle in tleList])
+    geoArgs = (repeat(geo.latitude, count), repeat(geo.longitude, count), repeat(geo.elevation, count))
+    jdArgs = (repeat(jd.value, count), repeat(jd.timezone, count))
+
+    try:
+        return list(executor.map(_findNthPassWorker, *args, *geoArgs, *jdArgs, repeat(visibleNumber, count),
+                                 chunksize=chunksize))
+    except BrokenProcessPool:
+        # A worker died, which leaves the pool unusable. Drop it so the next call starts a fresh one.
+        shutdownPassPool(wait=False)
+        raise
+
 
-    passList = []
-    for tle in tleList:
-        sat = Satellite(tle)
-        currentNumber = 0
+def _earliestInfo(a, b, c):
+    """Return whichever of the infos a, b and c happens first, ignoring any that are None. On a tie the first one
+    wins, like min()."""
 
-        np = getNextPass(sat, geo, jd)
-        if np.visible:
-            currentNumber = 1
+    # Unrolled rather than min() over a filtered list, this runs for every visible pass.
+    earliest = a
+    if b is not None and (earliest is None or b.time < earliest.time):
+        earliest = b
+    if c is not None and (earliest is None or c.time < earliest.time):
+        earliest = c
 
-        while currentNumber < visibleNumber:
-            # Some satellites wont produce visible passes, so stop after 7 days.
-            if np.riseInfo.time - jd > 7:
-                np = None
-                break
+    return earliest
 
-            np = getNextPass(sat, geo, np)
 
-            if np.visible:
-                currentNumber += 1
+def _passAppears(p):
+    """Return the earliest of the rise, first unobscured and first illuminated infos of a pass."""
 
-        passList.append(np)
+    return _earliestInfo(p.riseInfo, p.firstUnobscuredInfo, p.firstIlluminatedInfo)
 
-    return passList
+
+def _passDisappears(p):
+    """Return the earliest of the set, last unobscured and last illuminated infos of a pass."""
+
+    return _earliestInfo(p.setInfo, p.lastUnobscuredInfo, p.lastIlluminatedInfo)
+
+
+def _visibleMaxInfo(p, maxInfo=None):
+    """Return the highest visible info of a pass, or maxInfo if none of them are higher."""
+
+    for info in (p.maxInfo, p.lastIlluminatedInfo, p.lastUnobscuredInfo, p.setInfo):
+        if info is not None and info.visible and (maxInfo is None or info.altitude > maxInfo.altitude):
+            maxInfo = info
+
+    return maxInfo
 
 
 def getBatchTimes(df: pd.DataFrame, geo: GeoPosition, jd: JulianDate, visibleNumber=1) \
@@ -42,6 +157,11 @@ def getBatchTimes(df: pd.DataFrame, geo: GeoPosition, jd: JulianDate, visibleNum
     if not any(passList):
         return False, (None, None, None)
 
+    # With a single satellite its pass is the whole answer, so skip the scans over the pass list.
+    if len(passList) == 1 and passList[0].visible:
+        p = passList[0]
+        return True, (_passAppears(p), _visibleMaxInfo(p), _passDisappears(p))
+
     # Find the first time any sat becomes visible, and the first time any sat disappears.
     appearsIndex = -1
     appears, disappears = None, None
@@ -49,33 +169,23 @@ def getBatchTimes(df: pd.DataFrame, geo: GeoPosition, jd: JulianDate, visibleNum
         if p is None:
             continue
         if p.visible:
-            startTimes = [info for info in (p.riseInfo, p.firstUnobscuredInfo, p.firstIlluminatedInfo) if
-                          info is not None]
-            appears = min(startTimes, key=lambda o: o.time)
+            appears = _passAppears(p)
             appearsIndex = i
             break
 
-    # If passList is a single pass, we want to look at the same pass, so index should be -1, so it becomes 0 when we
-    # add 1.
-    if len(passList) == 1:
-        appearsIndex = -1
-    for p in reversed(passList[appearsIndex+1:]):
+    # Walk back by index, slicing the list would copy it just to find the last visible pass.
+    for i in range(len(passList) - 1, appearsIndex, -1):
+        p = passList[i]
         if p is None:
             continue
         if p.visible:
-            endTimes = [info for info in (p.setInfo, p.lastUnobscuredInfo, p.lastIlluminatedInfo) if
-                        info is not None]
-            disappears = min(endTimes, key=lambda o: o.time)
+            disappears = _passDisappears(p)
             break
 
-    maxInfos = []
+    # Keep a running maximum of the visible infos instead of collecting the maximum of each pass first.
+    maxInfo = None
     for p in passList:
-        if p is None:
-            continue
-        visibleInfos = [info for info in (p.maxInfo, p.lastIlluminatedInfo, p.lastUnobscuredInfo, p.setInfo)
-                        if info is not None and info.visible]
-        maxInfos.append(max(visibleInfos, key=lambda o: o.altitude))
-
-    maxInfo = max(maxInfos, key=lambda o: o.altitude)
+        if p is not None:
+            maxInfo = _visibleMaxInfo(p, maxInfo)
 
     return True, (appears, maxInfo, disappears)
@@ -1,35 +1,88 @@
+import email.utils
+import gzip
 import http.client
+import os
+import shutil
 
+from starlink.import_tle import clearTLECache
 
-def getResponse():
+CHUNK_SIZE = 64 * 1024
+
+
+def getResponse(modifiedSince: float | None = None):
     host = 'celestrak.org'
     conn = http.client.HTTPSConnection(host)
 
     path = '/NORAD/elements/supplemental/sup-gp.php?FILE=starlink&FORMAT=tle'
-    conn.request('GET', path)
+    # TLE text compresses well, so ask for a gzip encoded body.
+    headers = {'Accept-Encoding': 'gzip'}
+    # The TLEs are only refreshed a few times a day, so let the server answer with 304 Not Modified instead of the
+    # same body again.
+    if modifiedSince is not None:
+        headers['If-Modified-Since'] = email.utils.formatdate(modifiedSince, usegmt=True)
+    conn.request('GET', path, headers=headers)
 
     return conn.getresponse()
 
 
-def exportBody(filename):
-    resp = getResponse()
+def _serverTimestamp(resp) -> float | None:
+    """Return the Last-Modified time of the response as a timestamp, falling back to the server's Date, or None if
+    neither header can be parsed."""
+
+    for header in ('Last-Modified', 'Date'):
+        parsed = email.utils.parsedate_tz(resp.getheader(header, ''))
+        if parsed is not None:
+            return email.utils.mktime_tz(parsed)
+
+    return None
+
+
+def exportBody(filename, force=False) -> bool:
+    """Download the TLEs to filename, returning False without touching the file if the server reports it unchanged
+    since it was downloaded. If force is True the TLEs are always downloaded and the file rewritten."""
+
+    # The file's mtime is set to the server's time of the data it holds, see below.
+    modifiedSince = None
+    if not force and os.path.exists(filename):
+        modifiedSince = os.path.getmtime(filename)
+    resp = getResponse(modifiedSince)
+    if resp.status == 304:
+        return False
     if resp.status != 200:
         raise Exception(f'bad response: {resp.status}, {resp.reason}')
 
-    body = resp.read()
-    with open(filename, 'wb') as f:
-        bytesWritten = f.write(body)
+    body = resp
+    if resp.getheader('Content-Encoding', '').lower() == 'gzip':
+        body = gzip.GzipFile(fileobj=resp)
 
-    if bytesWritten != len(body):
-        raise IOError(f'unable to export all of response body, expected to write {len(resp)}, {len(bytesWritten)} '
-                      f'written')
+    # Stream the body to a temporary file and move it into place once complete, so the whole body is never held in
+    # memory and an interrupted download doesn't leave a truncated TLE file behind.
+    partialFilename = f'{filename}.part'
+    try:
+        with open(partialFilename, 'wb') as f:
+            shutil.copyfileobj(body, f, CHUNK_SIZE)
+        # Stamp the file with the server's modification time rather than the local time the download finished, so
+        # the next If-Modified-Since compares the server's clock against itself.
+        timestamp = _serverTimestamp(resp)
+        if timestamp is not None:
+            os.utime(partialFilename, (timestamp, timestamp))
+        os.replace(partialFilename, filename)
+    finally:
+        if os.path.exists(partialFilename):
+            os.remove(partialFilename)
 
+    return True
 
-def main():
+
+def main(force=False):
     try:
-        exportBody('starlink.tle')
+        updated = exportBody('starlink.tle', force)
     except IOError:
         return 1
+
+    # TLEs parsed from the previous file won't be used again.
+    if updated:
+        clearTLECache()
     return 0
 
 